@@ -1,9 +1,31 @@
 # app_agip.py
+import time
+
+# Inicio del script, para medir el tiempo hasta el primer render
+_inicio_script = time.perf_counter()
+
 import streamlit as st
 import os
-import time
+import logging
+import threading
 from datetime import datetime
-from asistente_agip import AsistenteAGIP
+
+# asistente_agip (langchain, FAISS, scikit-learn) se importa en segundo plano
+# desde CargadorAsistente para no retrasar el primer render de la página.
+# Para medir el costo de ese import por separado (referencia del arranque
+# anterior, que lo hacía antes de renderizar):
+#   python -c "import time; t = time.perf_counter(); import asistente_agip; print(time.perf_counter() - t)"
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Segundos que una consulta espera a que el asistente termine de cargar
+ESPERA_CARGA_ASISTENTE = 2
+
+# Aviso que acompaña las respuestas predefinidas mientras el asistente carga
+AVISO_ASISTENTE_CARGANDO = (
+    "<em>El asistente aún está cargando: esta es una respuesta general predefinida. "
+    "Vuelve a preguntar en unos segundos para obtener una respuesta basada en la documentación de AGIP.</em>\n\n"
+)
 
 # Configuración de la página
 st.set_page_config(
@@ -183,6 +205,39 @@ def get_fallback_response(question):
             "directamente con AGIP en su sitio oficial: https://www.agip.gob.ar/ o llamando al 0800-999-2447."
         )
 
+class CargadorAsistente:
+    """Importa y construye el asistente en un hilo en segundo plano"""
+
+    def __init__(self, api_key):
+        self.api_key = api_key
+        self.assistant = None
+        self.error = None
+        self.tiempos = {}
+        self.listo = threading.Event()
+        self.hilo = threading.Thread(target=self._cargar, daemon=True)
+        self.hilo.start()
+
+    def _cargar(self):
+        try:
+            inicio = time.perf_counter()
+            from asistente_agip import AsistenteAGIP
+            self.tiempos["import"] = time.perf_counter() - inicio
+
+            inicio = time.perf_counter()
+            assistant = AsistenteAGIP(claude_api_key=self.api_key)
+            self.tiempos["inicializacion"] = time.perf_counter() - inicio
+
+            self.assistant = assistant
+            logger.info(
+                "Asistente listo en segundo plano: " +
+                ", ".join(f"{etapa} {segundos:.2f} s" for etapa, segundos in self.tiempos.items())
+            )
+        except Exception as e:
+            logger.error(f"Error al iniciar el asistente en segundo plano: {e}")
+            self.error = e
+        finally:
+            self.listo.set()
+
 def display_messages():
     """Muestra los mensajes del chat con estilo"""
     for i, (msg, is_user, _) in enumerate(st.session_state["messages"]):
@@ -230,10 +285,17 @@ def process_input():
                     # Modo de respaldo ya activado
                     time.sleep(1)  # Simular procesamiento
                     response = get_fallback_response(user_text)
+                elif not st.session_state["loader"].listo.wait(timeout=ESPERA_CARGA_ASISTENTE):
+                    # El asistente sigue cargando: responder con el modo de respaldo por ahora
+                    response = AVISO_ASISTENTE_CARGANDO + get_fallback_response(user_text)
+                elif st.session_state["loader"].error is not None:
+                    st.warning(f"Error al iniciar el asistente. Activando modo de respaldo.")
+                    st.session_state["fallback_mode"] = True
+                    response = get_fallback_response(user_text)
                 else:
                     # Intentar usar el asistente real
                     try:
-                        response = st.session_state["assistant"].answer_question(
+                        response = st.session_state["loader"].assistant.answer_question(
                             user_text,
                             k=st.session_state.get("retrieval_k", 5)
                         )
@@ -259,38 +321,34 @@ def main():
         st.session_state["user_input"] = ""
         st.session_state["fallback_mode"] = False  # Añadir modo de respaldo
 
-        # Inicializar el asistente
-        with st.spinner("Iniciando el asistente..."):
-            api_key = os.environ.get("ANTHROPIC_API_KEY")
-
-            if not api_key:
-                st.warning("⚠️ No se ha configurado la clave API de Anthropic. Funcionando en modo de respaldo con respuestas predefinidas.")
-                st.session_state["fallback_mode"] = True
-                st.session_state["messages"].append((
-                    "¡Hola! Soy el asistente virtual de AGIP (versión de demostración). "
-                    "Puedo responder preguntas básicas sobre trámites y exenciones."
-                    "¿En qué puedo ayudarte hoy?",
-                    False, "neutral"
-                ))
-            else:
-                try:
-                    st.session_state["assistant"] = AsistenteAGIP(claude_api_key=api_key)
-                    st.session_state["messages"].append((
-                        "¡Hola! Soy el asistente virtual de AGIP especializado en trámites y exenciones. "
-                        "Puedo ayudarte a entender los requisitos, procedimientos y beneficios disponibles. "
-                        "¿En qué puedo ayudarte hoy?",
-                        False, "neutral"
-                    ))
-                except Exception as e:
-                    st.error(f"Error al iniciar el asistente: {str(e)}")
-                    st.warning("Funcionando en modo de respaldo con respuestas predefinidas.")
-                    st.session_state["fallback_mode"] = True
-                    st.session_state["messages"].append((
-                        "¡Hola! Soy el asistente virtual de AGIP (versión de demostración). "
-                        "Puedo responder preguntas básicas sobre trámites y exenciones. "
-                        "¿En qué puedo ayudarte hoy?",
-                        False, "neutral"
-                    ))
+        # Inicializar el asistente en segundo plano
+        api_key = os.environ.get("ANTHROPIC_API_KEY")
+
+        if not api_key:
+            st.warning("⚠️ No se ha configurado la clave API de Anthropic. Funcionando en modo de respaldo con respuestas predefinidas.")
+            st.session_state["fallback_mode"] = True
+            st.session_state["messages"].append((
+                "¡Hola! Soy el asistente virtual de AGIP (versión de demostración). "
+                "Puedo responder preguntas básicas sobre trámites y exenciones."
+                "¿En qué puedo ayudarte hoy?",
+                False, "neutral"
+            ))
+        else:
+            st.session_state["loader"] = CargadorAsistente(api_key)
+            st.session_state["messages"].append((
+                "¡Hola! Soy el asistente virtual de AGIP especializado en trámites y exenciones. "
+                "Puedo ayudarte a entender los requisitos, procedimientos y beneficios disponibles. "
+                "¿En qué puedo ayudarte hoy?",
+                False, "neutral"
+            ))
+
+    # Pasar a modo de respaldo si la carga en segundo plano falló
+    loader = st.session_state.get("loader")
+    if loader is not None and not st.session_state.get("fallback_mode", False) \
+            and loader.listo.is_set() and loader.error is not None:
+        st.error(f"Error al iniciar el asistente: {str(loader.error)}")
+        st.warning("Funcionando en modo de respaldo con respuestas predefinidas.")
+        st.session_state["fallback_mode"] = True
 
     # Mostrar banner de modo de respaldo si está activo
     if st.session_state.get("fallback_mode", False):
@@ -309,13 +367,16 @@ def main():
             if st.button("Intentar usar API de Claude"):
                 api_key = os.environ.get("ANTHROPIC_API_KEY")
                 if api_key:
-                    try:
-                        st.session_state["assistant"] = AsistenteAGIP(claude_api_key=api_key)
+                    with st.spinner("Conectando con Claude API..."):
+                        loader = CargadorAsistente(api_key)
+                        loader.listo.wait()
+                    if loader.error is None:
+                        st.session_state["loader"] = loader
                         st.session_state["fallback_mode"] = False
                         st.success("¡Conectado a Claude API exitosamente!")
                         st.experimental_rerun()
-                    except Exception as e:
-                        st.error(f"Error al conectar con Claude API: {str(e)}")
+                    else:
+                        st.error(f"Error al conectar con Claude API: {str(loader.error)}")
                 else:
                     st.error("No se ha configurado la clave API de Anthropic.")
 
@@ -328,6 +389,26 @@ def main():
                 value=5
             )
 
+            # Estado y tiempos de carga del asistente
+            loader = st.session_state.get("loader")
+            if loader is not None and not loader.listo.is_set():
+                st.info("Cargando la base de conocimiento...")
+            elif loader is not None and loader.tiempos:
+                st.caption("Tiempos de carga: " + ", ".join(
+                    f"{etapa} {segundos:.2f} s" for etapa, segundos in loader.tiempos.items()
+                ))
+            if "tiempo_primer_render" in st.session_state:
+                st.caption(f"Primer render: {st.session_state['tiempo_primer_render']:.2f} s")
+
+            # Versión activa de la base de conocimiento (se recarga sola al reconstruirla)
+            if loader is not None and loader.assistant is not None:
+                estado = loader.assistant.estado_indice()
+                st.caption(
+                    f"Base de conocimiento: versión {estado['version'] or 'sin versionar'}"
+                    f" (cargada en {estado['ultima_recarga_segundos']:.2f} s)"
+                    + (" · recargando..." if estado["recarga_en_curso"] else "")
+                )
+
         if st.button("Limpiar conversación"):
             st.session_state["messages"] = [st.session_state["messages"][0]]  # Mantener solo el mensaje de bienvenida
             st.experimental_rerun()
@@ -372,5 +453,10 @@ def main():
                     #st.session_state["user_input"] = "¿Cuál es el proceso para renovar una exención?"
                     #process_input()
 
+    # Medir el tiempo hasta el primer render de la sesión
+    if "tiempo_primer_render" not in st.session_state:
+        st.session_state["tiempo_primer_render"] = time.perf_counter() - _inicio_script
+        logger.info(f"Primer render en {st.session_state['tiempo_primer_render']:.2f} s")
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
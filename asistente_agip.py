@@ -8,12 +8,100 @@ from langchain_core.embeddings import Embeddings
 from sklearn.feature_extraction.text import TfidfVectorizer
 import numpy as np
 import os
+import json
+import time
+import hashlib
+import threading
+import weakref
 import logging
 import traceback
+from collections import Counter
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Archivo con las respuestas precalculadas de preguntas frecuentes, dentro del índice
+FAQ_FILENAME = "faq_respuestas.json"
+
+# Palabras que no cambian el sentido de una pregunta frecuente (sin tildes, como
+# las deja el vectorizador). Los interrogativos y las negaciones no están aquí
+PALABRAS_VACIAS = [
+    "a", "al", "ante", "buenas", "buenos", "con", "de", "del", "desde", "dias", "e", "el",
+    "en", "entre", "es", "esta", "este", "esto", "estos", "estas", "favor", "gracias",
+    "hay", "hola", "la", "las", "le", "les", "lo", "los", "me", "mi", "mis", "noches",
+    "o", "para", "por", "se", "ser", "son", "su", "sus", "tardes", "te", "u", "un",
+    "una", "unos", "unas", "y", "ya", "yo"
+]
+
+# Una negación en la consulta invierte el sentido de la pregunta frecuente
+NEGACIONES = {"no", "ni", "nunca", "jamas", "tampoco", "sin"}
+
+# Las compilaciones se guardan en <base>/versiones/<versión> y el archivo
+# <base>/CURRENT indica cuál está activa
+VERSIONES_DIR = "versiones"
+CURRENT_FILENAME = "CURRENT"
+
+# Plantilla de prompt compartida entre las consultas y la generación offline de FAQ
+PROMPT_TEMPLATE = """
+Eres un asistente virtual especializado en trámites y exenciones de AGIP (Administración Gubernamental de Ingresos Públicos).
+
+Tu objetivo es proporcionar información clara, precisa y empática sobre trámites y beneficios fiscales para las personas.
+
+Instrucciones:
+- Responde de manera clara y sencilla, evitando jerga técnica innecesaria
+- Muestra empatía hacia las personas con discapacidad y sus familias
+- Si la información específica no está en el contexto, indica claramente que el usuario debería consultar directamente con AGIP
+- Incluye información sobre dónde y cómo realizar los trámites cuando esté disponible
+- Menciona siempre los requisitos documentales necesarios
+- Estructura tus respuestas en párrafos breves y claros
+
+Contexto de la información:
+{context}
+
+Pregunta:
+{question}
+
+Respuesta:
+"""
+
+def construir_contexto(docs):
+    """Combina los documentos recuperados en el contexto que recibe el prompt"""
+    return "\n\n---\n\n".join([
+        f"[Documento: {doc.metadata.get('source', 'Desconocido')}, "
+        f"Página: {doc.metadata.get('page', 'N/A')}]\n{doc.page_content}"
+        for doc in docs
+    ])
+
+def calcular_hash_archivo(file_path):
+    """Calcula el SHA-256 de un archivo para detectar cambios en los PDFs fuente"""
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 20), b""):
+            sha256.update(bloque)
+    return sha256.hexdigest()
+
+def resolver_version(knowledge_base_dir):
+    """
+    Devuelve (versión, directorio) de la base de conocimiento activa según el
+    puntero CURRENT. Sin puntero se usa el directorio tal cual, con versión None
+    (formato anterior, sin versiones)
+    """
+    try:
+        with open(os.path.join(knowledge_base_dir, CURRENT_FILENAME), encoding="utf-8") as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        return None, knowledge_base_dir
+    return version, os.path.join(knowledge_base_dir, VERSIONES_DIR, version)
+
+def firma_archivo(file_path):
+    """Devuelve hash, tamaño y fecha de modificación de un archivo fuente"""
+    stat = os.stat(file_path)
+    return {
+        "sha256": calcular_hash_archivo(file_path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns
+    }
+
 # Clase para embeddings personalizados implementando la interfaz correcta
 class SimpleEmbeddings(Embeddings):
     def __init__(self, dimension=768):
@@ -52,12 +140,179 @@ class SimpleEmbeddings(Embeddings):
         except Exception as e:
             return self.default_vector
 
+class BaseConocimiento:
+    """
+    Una versión cargada de la base de conocimiento: índice FAISS, embeddings de
+    consulta y respuestas precalculadas de FAQ. Se reemplaza entera al recargar.
+    """
+
+    def __init__(self, directorio, version=None):
+        self.directorio = directorio
+        self.version = version
+
+        # Inicializar embeddings simples
+        self.embeddings = SimpleEmbeddings(dimension=768)
+
+        # Cargar base de conocimiento
+        try:
+            if os.path.exists(directorio):
+                self.vector_store = FAISS.load_local(
+                    folder_path=directorio,
+                    embeddings=self.embeddings,
+                    allow_dangerous_deserialization=True
+                )
+                self.retriever = self.vector_store.as_retriever(
+                    search_kwargs={"k": 5}
+                )
+                logger.info(f"Base de conocimiento cargada desde {directorio} (versión {version})")
+            else:
+                raise ValueError(f"No se encontró la base de conocimiento en {directorio}")
+        except Exception as e:
+            logger.error(f"Error al cargar la base de conocimiento: {e}")
+            logger.error(traceback.format_exc())
+            raise
+
+        # Respuestas precalculadas para preguntas frecuentes
+        self._cargar_faq(os.path.join(directorio, FAQ_FILENAME))
+
+    def _cargar_faq(self, faq_path):
+        """Carga las respuestas precalculadas y calcula los embeddings de sus preguntas"""
+        # (entradas, vectores) se reemplazan juntos para que las lecturas concurrentes sean consistentes
+        self.faq = ([], None)
+        self.faq_vectorizer = None
+        self.faq_pdf_dir = ""
+
+        if not os.path.exists(faq_path):
+            logger.info(f"No hay respuestas precalculadas de FAQ en {faq_path}")
+            return
+
+        try:
+            with open(faq_path, encoding="utf-8") as f:
+                data = json.load(f)
+
+            self.faq_pdf_dir = data.get("directorio_pdfs", "")
+            entries = [
+                entry for entry in data.get("preguntas", [])
+                if all(self._fuente_vigente(nombre, firma)
+                       for nombre, firma in entry.get("fuentes", {}).items())
+            ]
+            descartadas = len(data.get("preguntas", [])) - len(entries)
+            if descartadas:
+                logger.info(f"Se descartaron {descartadas} respuestas de FAQ con PDFs fuente modificados o inexistentes")
+
+            if entries:
+                # Vocabulario propio, ajustado sobre las preguntas frecuentes
+                self.faq_vectorizer = TfidfVectorizer(
+                    norm=None, strip_accents="unicode", stop_words=PALABRAS_VACIAS
+                )
+                self.faq_vectorizer.fit([e["pregunta"] for e in entries])
+                vectors = np.array([self._vector_faq(e["pregunta"]) for e in entries])
+                self.faq = (entries, vectors)
+            logger.info(f"Cargadas {len(entries)} respuestas precalculadas de FAQ")
+        except Exception as e:
+            logger.error(f"Error al cargar las respuestas de FAQ: {e}")
+            logger.error(traceback.format_exc())
+            self.faq = ([], None)
+
+    def _fuente_vigente(self, nombre, firma):
+        """Indica si un PDF fuente sigue siendo el mismo con el que se generó la respuesta"""
+        file_path = os.path.join(self.faq_pdf_dir, nombre)
+        try:
+            stat = os.stat(file_path)
+            if stat.st_size == firma["size"] and stat.st_mtime_ns == firma["mtime_ns"]:
+                return True
+            return calcular_hash_archivo(file_path) == firma["sha256"]
+        except OSError:
+            logger.warning(f"No se encontró el PDF fuente de una respuesta de FAQ: {file_path}")
+            return False
+        except KeyError:
+            return False
+
+    def _vector_faq(self, text):
+        """
+        Vector TF-IDF de norma 1 en el vocabulario de las FAQ. Las palabras fuera
+        de ese vocabulario suman a la norma con el peso IDF máximo, de modo que
+        una pregunta que agrega otro tema ("Clave Ciudad", "ABL", "no tengo")
+        se aleja de la FAQ en lugar de ignorarse.
+        """
+        raw = self.faq_vectorizer.transform([text]).toarray()[0]
+        vocabulario = self.faq_vectorizer.vocabulary_
+        desconocidas = Counter(t for t in self.faq_vectorizer.build_analyzer()(text) if t not in vocabulario)
+        max_idf = self.faq_vectorizer.idf_.max()
+        norm = np.sqrt(raw @ raw + sum((c * max_idf) ** 2 for c in desconocidas.values()))
+        return raw / norm if norm > 0 else raw
+
+    def _mismas_palabras(self, question, pregunta_faq):
+        """
+        Indica si la consulta usa exactamente las palabras de contenido de la
+        pregunta frecuente: una palabra de más o de menos ("solicitar" por
+        "renovar", "de patentes", "no") puede cambiar la respuesta correcta
+        """
+        analizar = self.faq_vectorizer.build_analyzer()
+        consulta, faq = set(analizar(question)), set(analizar(pregunta_faq))
+        return consulta == faq and (consulta & NEGACIONES) == (faq & NEGACIONES)
+
+    def buscar_faq(self, question, threshold):
+        """
+        Devuelve la respuesta precalculada de la FAQ más similar a la pregunta,
+        o None si ninguna supera el umbral o sus PDFs fuente cambiaron
+        """
+        entries, vectors = self.faq
+        if vectors is None:
+            return None
+
+        start = time.perf_counter()
+        scores = vectors @ self._vector_faq(question)
+        best = int(np.argmax(scores))
+        if scores[best] < threshold:
+            return None
+
+        entry = entries[best]
+        if not self._mismas_palabras(question, entry["pregunta"]):
+            return None
+
+        if not all(self._fuente_vigente(nombre, firma) for nombre, firma in entry.get("fuentes", {}).items()):
+            # Los PDFs cambiaron desde la generación: invalidar la respuesta
+            logger.info(f"Respuesta de FAQ invalidada por cambios en sus fuentes: {entry['pregunta']}")
+            self._descartar_faq(entry)
+            return None
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        logger.info(f"Respuesta de FAQ (similitud {scores[best]:.2f}) en {elapsed_ms:.1f} ms: {entry['pregunta']}")
+        return entry["respuesta"]
+
+    def _descartar_faq(self, entry):
+        """Quita una respuesta invalidada del índice de FAQ en memoria"""
+        entries, vectors = self.faq
+        if entry not in entries:
+            return
+        index = entries.index(entry)
+        entries = entries[:index] + entries[index + 1:]
+        self.faq = (entries, np.delete(vectors, index, axis=0) if entries else None)
+
+def _vigilar_versiones(ref_asistente, intervalo):
+    """
+    Revisa periódicamente el puntero CURRENT para que una versión nueva se cargue
+    sin esperar a la próxima consulta. Termina cuando el asistente se libera
+    """
+    while True:
+        time.sleep(intervalo)
+        asistente = ref_asistente()
+        if asistente is None:
+            return
+        asistente.recargar_si_cambio(forzar=True)
+        del asistente
+
 class AsistenteAGIP:
     """Asistente para consultas sobre trámites y exenciones de AGIP utilizando Claude"""
 
-    def __init__(self, claude_api_key=None, knowledge_base_dir="faiss_index"):
+    def __init__(self, claude_api_key=None, knowledge_base_dir="faiss_index", faq_threshold=0.95,
+                 reload_interval=5):
         """
         Inicializa el asistente con Claude y la base de conocimiento
+
+        faq_threshold: similitud mínima para responder con una FAQ precalculada.
+        reload_interval: segundos entre revisiones del puntero CURRENT.
         """
         # Verificar clave API
         api_key = claude_api_key or os.environ.get("ANTHROPIC_API_KEY")
@@ -78,66 +333,72 @@ class AsistenteAGIP:
             logger.error(traceback.format_exc())
             raise
 
-        # Inicializar embeddings simples
-        self.embeddings = SimpleEmbeddings(dimension=768)
+        # Cargar la versión activa de la base de conocimiento
+        self.knowledge_base_dir = knowledge_base_dir
+        self.reload_interval = reload_interval
+        self.ultima_recarga_segundos = None
+        self._ultima_verificacion = time.monotonic()
+        self._recarga_en_curso = threading.Lock()
+        self._version_fallida = None
 
-        # Cargar base de conocimiento
-        try:
-            if os.path.exists(knowledge_base_dir):
-                self.vector_store = FAISS.load_local(
-                    folder_path=knowledge_base_dir,
-                    embeddings=self.embeddings,
-                    allow_dangerous_deserialization=True
-                )
-                self.retriever = self.vector_store.as_retriever(
-                    search_kwargs={"k": 5}
-                )
-                logger.info(f"Base de conocimiento cargada desde {knowledge_base_dir}")
-            else:
-                raise ValueError(f"No se encontró la base de conocimiento en {knowledge_base_dir}")
-        except Exception as e:
-            logger.error(f"Error al cargar la base de conocimiento: {e}")
-            logger.error(traceback.format_exc())
-            raise
+        start = time.perf_counter()
+        version, directorio = resolver_version(knowledge_base_dir)
+        self.base = BaseConocimiento(directorio, version)
+        self.ultima_recarga_segundos = time.perf_counter() - start
 
         # Plantilla de prompt para consultas
-        self.prompt = ChatPromptTemplate.from_template(
-            """
-            Eres un asistente virtual especializado en trámites y exenciones de AGIP (Administración Gubernamental de Ingresos Públicos).
-            
-            Tu objetivo es proporcionar información clara, precisa y empática sobre trámites y beneficios fiscales para las personas.
-            
-            Instrucciones:
-            - Responde de manera clara y sencilla, evitando jerga técnica innecesaria
-            - Muestra empatía hacia las personas con discapacidad y sus familias
-            - Si la información específica no está en el contexto, indica claramente que el usuario debería consultar directamente con AGIP
-            - Incluye información sobre dónde y cómo realizar los trámites cuando esté disponible
-            - Menciona siempre los requisitos documentales necesarios
-            - Estructura tus respuestas en párrafos breves y claros
-            
-            Contexto de la información:
-            {context}
-            
-            Pregunta:
-            {question}
-            
-            Respuesta:
-            """
-        )
+        self.prompt = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
+
+        self.faq_threshold = faq_threshold
 
         # Historial de interacciones
         self.history = []
 
+        # Detectar versiones nuevas también mientras no hay consultas
+        if reload_interval > 0:
+            threading.Thread(
+                target=_vigilar_versiones, args=(weakref.ref(self), reload_interval), daemon=True
+            ).start()
+
+    @property
+    def vector_store(self):
+        return self.base.vector_store
+
+    @property
+    def embeddings(self):
+        return self.base.embeddings
+
+    @property
+    def version(self):
+        """Versión activa de la base de conocimiento (None si no está versionada)"""
+        return self.base.version
+
     def answer_question(self, question, k=5):
         """
         Responde a una pregunta usando RAG con la base de conocimiento
         """
+        # Tomar la versión activa: una recarga concurrente no afecta esta consulta
+        self.recargar_si_cambio()
+        base = self.base
+
         # Configurar retriever si se modifican los parámetros
         if k != 5:
-            self.retriever = self.vector_store.as_retriever(
+            base.retriever = base.vector_store.as_retriever(
                 search_kwargs={"k": k}
             )
 
+        # Responder sin invocar a Claude si la pregunta coincide con una FAQ vigente
+        try:
+            faq_response = base.buscar_faq(question, self.faq_threshold)
+        except Exception as e:
+            # Un error en las FAQ no debe impedir responder con RAG
+            logger.error(f"Error al buscar en las respuestas de FAQ: {e}")
+            logger.error(traceback.format_exc())
+            faq_response = None
+        if faq_response is not None:
+            self.history.append((question, faq_response))
+            return faq_response
+
         # Recuperar documentos relevantes
         try:
             logger.info(f"Buscando documentos relevantes para: {question}")
@@ -146,9 +407,9 @@ class AsistenteAGIP:
             relevant_docs = []
             try:
                 # Crear consulta directamente con la misma clase de embeddings
-                query_embedding = self.embeddings.embed_query(question)
+                query_embedding = base.embeddings.embed_query(question)
                 # Usar el método search_by_vector directamente
-                docs_and_scores = self.vector_store.similarity_search_with_score_by_vector(
+                docs_and_scores = base.vector_store.similarity_search_with_score_by_vector(
                     query_embedding, k=k
                 )
                 # Extraer solo los documentos
@@ -169,11 +430,7 @@ class AsistenteAGIP:
 
             # Crear contexto combinado
             logger.info("Construyendo contexto a partir de documentos relevantes")
-            context = "\n\n---\n\n".join([
-                f"[Documento: {doc.metadata.get('source', 'Desconocido')}, "
-                f"Página: {doc.metadata.get('page', 'N/A')}]\n{doc.page_content}"
-                for doc in relevant_docs
-            ])
+            context = construir_contexto(relevant_docs)
 
             # Preparar datos para el prompt
             formatted_input = {
@@ -209,6 +466,54 @@ class AsistenteAGIP:
             # Enviar mensaje más genérico al usuario
             return f"Lo siento, ocurrió un error al procesar tu consulta. Por favor, intenta nuevamente con otra pregunta o contacta directamente con AGIP al 0800-999-2447."
 
+    def recargar_si_cambio(self, forzar=False):
+        """
+        Revisa el puntero CURRENT (como máximo cada reload_interval segundos,
+        salvo con forzar) y, si apunta a otra versión, la carga en un hilo en
+        segundo plano. Devuelve True si se inició una recarga.
+        """
+        ahora = time.monotonic()
+        if not forzar and ahora - self._ultima_verificacion < self.reload_interval:
+            return False
+        self._ultima_verificacion = ahora
+
+        version, directorio = resolver_version(self.knowledge_base_dir)
+        if version == self.base.version or version == self._version_fallida:
+            # Una versión que ya falló solo se reintenta cuando CURRENT cambie de nuevo
+            return False
+
+        # Una sola recarga a la vez; las consultas nunca esperan este lock
+        if not self._recarga_en_curso.acquire(blocking=False):
+            return False
+        threading.Thread(target=self._recargar, args=(version, directorio), daemon=True).start()
+        return True
+
+    def _recargar(self, version, directorio):
+        """Carga una versión nueva y la activa reemplazando la referencia a la base"""
+        try:
+            start = time.perf_counter()
+            nueva = BaseConocimiento(directorio, version)
+            # Las consultas en curso terminan con la versión anterior que ya tomaron
+            self.base = nueva
+            self.ultima_recarga_segundos = time.perf_counter() - start
+            logger.info(f"Base de conocimiento recargada a la versión {version} en {self.ultima_recarga_segundos:.2f} s")
+        except Exception as e:
+            self._version_fallida = version
+            logger.error(f"Error al recargar la versión {version} de la base de conocimiento: {e}")
+            logger.error(traceback.format_exc())
+        finally:
+            self._recarga_en_curso.release()
+
+    def estado_indice(self):
+        """Devuelve la versión activa de la base y la duración de la última carga"""
+        return {
+            "version": self.base.version,
+            "directorio": self.base.directorio,
+            "ultima_recarga_segundos": self.ultima_recarga_segundos,
+            "recarga_en_curso": self._recarga_en_curso.locked(),
+            "version_fallida": self._version_fallida
+        }
+
     def get_history(self):
         """Devuelve el historial de conversación"""
         return self.history
\ No newline at end of file
@@ -2,57 +2,36 @@
 from langchain_community.vectorstores import FAISS
 from langchain_community.document_loaders import PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_core.embeddings import Embeddings
-from sklearn.feature_extraction.text import TfidfVectorizer
-import numpy as np
+from langchain_anthropic import ChatAnthropic
+from langchain_core.prompts import ChatPromptTemplate
+from langchain.schema.output_parser import StrOutputParser
+from asistente_agip import (
+    PROMPT_TEMPLATE, FAQ_FILENAME, VERSIONES_DIR, CURRENT_FILENAME,
+    SimpleEmbeddings, construir_contexto, firma_archivo, resolver_version
+)
+from datetime import datetime
 import os
+import json
 import logging
 import shutil
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Clase para embeddings personalizados - IDÉNTICA a la de asistente_agip.py
-class SimpleEmbeddings(Embeddings):
-    def __init__(self, dimension=768):
-        self.dimension = dimension
-        self.tfidf = TfidfVectorizer(max_features=dimension)
-        self.fitted = False
-        self.default_vector = np.zeros(dimension).astype(np.float32).tolist()
-
-    def _ensure_dimension(self, vector):
-        """Asegura que el vector tenga la dimensión correcta"""
-        if len(vector) < self.dimension:
-            return vector + [0.0] * (self.dimension - len(vector))
-        elif len(vector) > self.dimension:
-            return vector[:self.dimension]
-        return vector
-
-    def embed_documents(self, texts):
-        try:
-            if not self.fitted:
-                self.tfidf.fit(texts)
-                self.fitted = True
-
-            vectors = self.tfidf.transform(texts).toarray().astype(np.float32)
-            return [self._ensure_dimension(v.tolist()) for v in vectors]
-        except Exception as e:
-            return [self.default_vector for _ in texts]
-
-    def embed_query(self, text):
-        try:
-            if not self.fitted:
-                self.tfidf.fit([text])
-                self.fitted = True
-
-            vector = self.tfidf.transform([text]).toarray()[0].astype(np.float32)
-            return self._ensure_dimension(vector.tolist())
-        except Exception as e:
-            return self.default_vector
+# Preguntas frecuentes cuyas respuestas se precalculan por defecto
+PREGUNTAS_FRECUENTES = [
+    "¿Qué documentos necesito para solicitar la exención por discapacidad?",
+    "¿Dónde puedo realizar los trámites por discapacidad?",
+    "¿Qué impuestos pueden ser eximidos por discapacidad?",
+    "¿Cuál es el proceso para renovar una exención?",
+]
 
 class ProcesadorPDFs:
-    def __init__(self):
+    def __init__(self, claude_api_key=None):
         """Inicializa el procesador de PDFs con embeddings simples"""
+        # Clave API para generar las respuestas de preguntas frecuentes
+        self.claude_api_key = claude_api_key or os.environ.get("ANTHROPIC_API_KEY")
+
         # Configurar embeddings
         self.embeddings = SimpleEmbeddings(dimension=768)
 
@@ -64,8 +43,14 @@ class ProcesadorPDFs:
             keep_separator=True
         )
 
-    def procesar_directorio(self, directorio_pdfs, directorio_salida="faiss_index"):
-        """Procesa todos los PDFs en un directorio"""
+    def procesar_directorio(self, directorio_pdfs, directorio_salida="faiss_index", preguntas_frecuentes=None,
+                            versiones_a_conservar=3):
+        """
+        Procesa todos los PDFs en un directorio y guarda el resultado como una
+        versión nueva en <directorio_salida>/versiones/<versión>. Al terminar se
+        actualiza el puntero CURRENT, de modo que los procesos en ejecución
+        nunca leen un índice a medio escribir.
+        """
         logger.info(f"Procesando PDFs en {directorio_pdfs}")
 
         all_docs = []
@@ -100,10 +85,9 @@ class ProcesadorPDFs:
         chunks = self.text_splitter.split_documents(all_docs)
         logger.info(f"Se crearon {len(chunks)} fragmentos de texto")
 
-        # Limpiar directorio de salida si existe
-        if os.path.exists(directorio_salida):
-            logger.info(f"Eliminando directorio de salida existente: {directorio_salida}")
-            shutil.rmtree(directorio_salida)
+        # Conservar las respuestas de FAQ de la versión activa para reutilizar las que sigan vigentes
+        _, directorio_activo = resolver_version(directorio_salida)
+        faq_previas = self._leer_faq(os.path.join(directorio_activo, FAQ_FILENAME))
 
         # Crear vector store con FAISS
         vector_store = FAISS.from_documents(
@@ -111,15 +95,181 @@ class ProcesadorPDFs:
             embedding=self.embeddings
         )
 
-        # Guardar el índice FAISS
-        if not os.path.exists(directorio_salida):
-            os.makedirs(directorio_salida)
+        # Guardar el índice FAISS en un directorio de versión nuevo
+        version = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        directorio_version = os.path.join(directorio_salida, VERSIONES_DIR, version)
+        os.makedirs(directorio_version)
+
+        vector_store.save_local(directorio_version)
+
+        # Precalcular respuestas de preguntas frecuentes
+        if preguntas_frecuentes is None:
+            preguntas_frecuentes = PREGUNTAS_FRECUENTES
+        generadas = None
+        if preguntas_frecuentes:
+            generadas = self.generar_faq(vector_store, directorio_pdfs, directorio_version, preguntas_frecuentes, faq_previas)
+        if generadas is None:
+            # Sin generación (sin clave API o --sin-faq): mantener las respuestas que siguen vigentes
+            self.conservar_faq(faq_previas, directorio_version)
 
-        vector_store.save_local(directorio_salida)
+        # Activar la versión nueva y eliminar las más antiguas
+        self.activar_version(directorio_salida, version)
+        self.limpiar_versiones(directorio_salida, versiones_a_conservar)
 
-        logger.info(f"Base de conocimiento creada exitosamente en {directorio_salida}")
+        logger.info(f"Base de conocimiento creada exitosamente en {directorio_version}")
         return vector_store
 
+    def activar_version(self, directorio_salida, version):
+        """Apunta CURRENT a la versión indicada reemplazando el archivo de forma atómica"""
+        current_path = os.path.join(directorio_salida, CURRENT_FILENAME)
+        tmp_path = f"{current_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, current_path)
+        logger.info(f"Versión activa de la base de conocimiento: {version}")
+
+    def limpiar_versiones(self, directorio_salida, conservar):
+        """
+        Elimina las versiones más antiguas, conservando la más reciente, las
+        `conservar` anteriores a ella y siempre la activa. Los procesos que
+        cargaron una versión eliminada la siguen usando desde memoria.
+        """
+        directorio_versiones = os.path.join(directorio_salida, VERSIONES_DIR)
+        version_activa, _ = resolver_version(directorio_salida)
+        versiones = sorted(os.listdir(directorio_versiones), reverse=True)
+        for version in versiones[max(conservar, 0) + 1:]:
+            if version != version_activa:
+                logger.info(f"Eliminando versión antigua de la base de conocimiento: {version}")
+                shutil.rmtree(os.path.join(directorio_versiones, version), ignore_errors=True)
+
+    def _leer_faq(self, faq_path):
+        """Lee un archivo de respuestas de FAQ existente, o devuelve None"""
+        if not os.path.exists(faq_path):
+            return None
+        try:
+            with open(faq_path, encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"No se pudo leer el archivo de FAQ existente {faq_path}: {e}")
+            return None
+
+    def _previa_vigente(self, entry, directorio_pdfs):
+        """
+        Devuelve la respuesta anterior con las firmas actualizadas si ninguno de
+        sus PDFs fuente cambió de contenido, o None
+        """
+        try:
+            fuentes = {
+                nombre: firma_archivo(os.path.join(directorio_pdfs, nombre))
+                for nombre in entry.get("fuentes", {})
+            }
+            if any(fuentes[n]["sha256"] != f["sha256"] for n, f in entry["fuentes"].items()):
+                return None
+        except (OSError, KeyError) as e:
+            logger.warning(f"No se puede verificar la respuesta de FAQ anterior '{entry.get('pregunta')}': {e}")
+            return None
+        return dict(entry, fuentes=fuentes)
+
+    def conservar_faq(self, faq_previas, directorio_salida):
+        """Copia a la versión nueva las respuestas de FAQ anteriores cuyos PDFs fuente no cambiaron"""
+        if not faq_previas:
+            return []
+
+        directorio_pdfs = os.path.abspath(faq_previas.get("directorio_pdfs", ""))
+        entradas = []
+        for entry in faq_previas.get("preguntas", []):
+            vigente = self._previa_vigente(entry, directorio_pdfs)
+            if vigente is not None:
+                entradas.append(vigente)
+
+        faq_path = os.path.join(directorio_salida, FAQ_FILENAME)
+        with open(faq_path, "w", encoding="utf-8") as f:
+            json.dump({"directorio_pdfs": directorio_pdfs, "preguntas": entradas}, f, ensure_ascii=False, indent=2)
+
+        logger.info(f"Se conservaron {len(entradas)} respuestas de FAQ anteriores en {faq_path}")
+        return entradas
+
+    def generar_faq(self, vector_store, directorio_pdfs, directorio_salida, preguntas, faq_previas=None, k=5):
+        """
+        Genera y guarda las respuestas de las preguntas frecuentes junto con sus
+        fragmentos fuente y la firma de los PDFs usados, para que el asistente
+        pueda servirlas sin invocar a Claude e invalidarlas si los PDFs cambian
+        """
+        if not self.claude_api_key:
+            logger.warning("No se configuró ANTHROPIC_API_KEY: se omite la generación de respuestas de FAQ")
+            return None
+
+        model = ChatAnthropic(
+            model="claude-3-7-sonnet-20250219",
+            temperature=0.1,
+            anthropic_api_key=self.claude_api_key,
+            max_tokens=1000
+        )
+        chain = ChatPromptTemplate.from_template(PROMPT_TEMPLATE) | model | StrOutputParser()
+
+        # Ruta absoluta: el asistente puede ejecutarse desde otro directorio de trabajo
+        directorio_pdfs = os.path.abspath(directorio_pdfs)
+
+        # Respuestas anteriores reutilizables: misma carpeta de PDFs y fuentes sin cambios
+        previas = {}
+        if faq_previas and os.path.abspath(faq_previas.get("directorio_pdfs", "")) == directorio_pdfs:
+            previas = {entry["pregunta"]: entry for entry in faq_previas.get("preguntas", [])}
+
+        firmas = {}
+        entradas = []
+        for pregunta in preguntas:
+            try:
+                docs = vector_store.similarity_search(pregunta, k=k)
+                if not docs:
+                    logger.warning(f"Sin documentos relevantes para la FAQ: {pregunta}")
+                    continue
+
+                fuentes = {}
+                for doc in docs:
+                    nombre = doc.metadata.get("source")
+                    if nombre not in firmas:
+                        firmas[nombre] = firma_archivo(os.path.join(directorio_pdfs, nombre))
+                    fuentes[nombre] = firmas[nombre]
+
+                previa = previas.get(pregunta)
+                if previa and {n: f["sha256"] for n, f in previa.get("fuentes", {}).items()} == \
+                        {n: f["sha256"] for n, f in fuentes.items()}:
+                    respuesta = previa["respuesta"]
+                    logger.info(f"Reutilizando respuesta de FAQ vigente: {pregunta}")
+                else:
+                    respuesta = chain.invoke({"context": construir_contexto(docs), "question": pregunta})
+                    logger.info(f"Respuesta de FAQ generada: {pregunta}")
+
+                entradas.append({
+                    "pregunta": pregunta,
+                    "respuesta": respuesta,
+                    "fragmentos": [
+                        {
+                            "source": doc.metadata.get("source"),
+                            "page": doc.metadata.get("page"),
+                            "contenido": doc.page_content
+                        }
+                        for doc in docs
+                    ],
+                    "fuentes": fuentes
+                })
+            except Exception as e:
+                logger.error(f"Error generando la respuesta de FAQ '{pregunta}': {e}")
+                # Mantener la respuesta anterior si sus fuentes no cambiaron
+                vigente = self._previa_vigente(previas[pregunta], directorio_pdfs) if pregunta in previas else None
+                if vigente is not None:
+                    logger.info(f"Se conserva la respuesta de FAQ anterior: {pregunta}")
+                    entradas.append(vigente)
+
+        faq_path = os.path.join(directorio_salida, FAQ_FILENAME)
+        with open(faq_path, "w", encoding="utf-8") as f:
+            json.dump({"directorio_pdfs": directorio_pdfs, "preguntas": entradas}, f, ensure_ascii=False, indent=2)
+
+        logger.info(f"Se guardaron {len(entradas)} respuestas de FAQ en {faq_path}")
+        return entradas
+
 # Ejecutar el procesamiento si se ejecuta el script directamente
 if __name__ == "__main__":
     import argparse
@@ -127,8 +277,18 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Procesa PDFs para crear una base de conocimiento vectorial")
     parser.add_argument("--dir", required=True, help="Directorio donde se encuentran los PDFs")
     parser.add_argument("--output", default="faiss_index", help="Directorio donde guardar la base de conocimiento")
+    parser.add_argument("--faq", help="Archivo JSON con la lista de preguntas frecuentes a precalcular")
+    parser.add_argument("--sin-faq", action="store_true", help="No generar respuestas precalculadas de FAQ")
+    parser.add_argument("--conservar", type=int, default=3, help="Cantidad de versiones anteriores a conservar, además de la nueva")
 
     args = parser.parse_args()
 
+    preguntas = None
+    if args.sin_faq:
+        preguntas = []
+    elif args.faq:
+        with open(args.faq, encoding="utf-8") as f:
+            preguntas = json.load(f)
+
     procesador = ProcesadorPDFs()
-    procesador.procesar_directorio(args.dir, args.output)
\ No newline at end of file
+    procesador.procesar_directorio(args.dir, args.output, preguntas, args.conservar)
\ No newline at end of file